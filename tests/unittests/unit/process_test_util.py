@@ -11,6 +11,7 @@ import time
 import tempfile
 import unittest
 import subprocess
+from threading import Lock
 
 from xpra.util import envbool, envint, repr_ellipsized
 from xpra.os_util import (
@@ -31,6 +32,9 @@ DELETE_TEMP_FILES = envbool("XPRA_DELETE_TEMP_FILES", True)
 SHOW_XORG_OUTPUT = envbool("XPRA_SHOW_XORG_OUTPUT", False)
 TEST_XVFB_COMMAND = os.environ.get("XPRA_TEST_VFB_COMMAND", "Xvfb")
 
+#tests may allocate displays from multiple threads:
+display_lock = Lock()
+
 
 def show_proc_pipes(proc):
     def showfile(fileobj, filetype="stdout"):
@@ -94,7 +98,10 @@ class ProcessTestUtil(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        cls.display_start = 100
+        cls.display_start = envint("XPRA_TEST_DISPLAY_START", 100)
+        #parallel test runners use a stride of 100 to keep each worker in its own lane:
+        cls.display_stride = envint("XPRA_TEST_DISPLAY_STRIDE", 1)
+        cls.allocated_displays = set()
         cls.temp_files = []
         cls.processes = []
         cls.xauthority_temp = None #tempfile.NamedTemporaryFile(prefix="xpra-test.", suffix=".xauth", delete=False)
@@ -188,6 +195,15 @@ class ProcessTestUtil(unittest.TestCase):
     def class_run_command(cls, command, **kwargs):
         if "env" not in kwargs:
             kwargs["env"] = cls.get_default_run_env()
+        #allow subprocess to use posix_spawn / vfork rather than a full fork+exec,
+        #this requires close_fds=False (safe since python file descriptors are not inheritable)
+        #and an executable path that includes a directory.
+        #(never add a 'preexec_fn' here as that forces the slow fork path)
+        kwargs.setdefault("close_fds", False)
+        if isinstance(command, (list, tuple)) and not kwargs.get("shell") and not os.path.dirname(command[0]):
+            exe = shutil.which(command[0], path=(kwargs.get("env") or os.environ).get("PATH"))
+            if exe:
+                command = [exe]+list(command[1:])
         stdout_file = stderr_file = None
         if isinstance(command, (list, tuple)):
             strcommand = " ".join("'%s'" % x for x in command)
@@ -292,15 +308,18 @@ class ProcessTestUtil(unittest.TestCase):
     def find_free_display_no(cls, exclude=()):
         #X11 sockets:
         X11_displays = cls.find_X11_displays()
-        start = cls.display_start % 10000
-        for i in range(start, 20000):
-            display = "%s%s" % (DISPLAY_PREFIX, i)
-            if display in exclude:
-                continue
-            if display in X11_displays:
-                continue
-            cls.display_start += 100
-            return i
+        with display_lock:
+            start = cls.display_start % 10000
+            for i in range(start, 20000, cls.display_stride):
+                display = "%s%s" % (DISPLAY_PREFIX, i)
+                if display in exclude:
+                    continue
+                if display in X11_displays:
+                    continue
+                #next time, start after the display we are returning:
+                cls.display_start = i+100
+                cls.allocated_displays.add(display)
+                return i
         raise Exception("failed to find any free displays!")
 
     @classmethod
@@ -92,7 +92,8 @@ def main(args):
         for path in paths:
             p = os.path.join(d, path)
             v = 0
-            if os.path.isfile(p) and p.endswith("test.py"):
+            #pytest configuration files are not tests:
+            if os.path.isfile(p) and p.endswith("test.py") and path!="conftest.py":
                 v = run_file(p)
             elif os.path.isdir(p):
                 fp = os.path.join(d, p)
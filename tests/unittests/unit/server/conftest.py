@@ -0,0 +1,49 @@
+# This file is part of Xpra.
+# Copyright (C) 2022 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+pytest configuration for the server tests,
+which can be distributed across cores using pytest-xdist:
+  pytest -n auto unit/server
+The tests can still be executed individually or via unit/run.py
+"""
+
+import os
+import pytest
+
+from xpra.os_util import OSX, POSIX
+from unit.server_test_util import ServerTestUtil
+
+
+#each xdist worker ("gw0", "gw1", etc) allocates displays from its own lane:
+#worker N only uses display numbers equal to N modulo 100 (100+N, 200+N, ..),
+#so the workers cannot pick the same display (unless there are more than 100 workers)
+worker = os.environ.get("PYTEST_XDIST_WORKER", "")
+if worker.startswith("gw") and "XPRA_TEST_DISPLAY_START" not in os.environ:
+    os.environ["XPRA_TEST_DISPLAY_START"] = str(100+int(worker[2:])%100)
+    os.environ["XPRA_TEST_DISPLAY_STRIDE"] = "100"
+
+#these modules only run their tests on POSIX platforms other than MacOS,
+#see the main() function in each one of them:
+POSIX_ONLY_MODULES = ("dbus_test", "server_auth_test", "server_sockets_test", "shadow_server_test")
+
+SERVER_TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: the test starts real xpra servers")
+
+
+def pytest_collection_modifyitems(items):
+    for item in items:
+        #this hook sees every collected item, not just the ones from this directory:
+        if not str(item.fspath).startswith(SERVER_TESTS_DIR+os.sep):
+            continue
+        cls = getattr(item, "cls", None)
+        if cls and issubclass(cls, ServerTestUtil):
+            item.add_marker(pytest.mark.slow)
+        module = item.module.__name__.split(".")[-1]
+        if module in POSIX_ONLY_MODULES and (not POSIX or OSX):
+            item.add_marker(pytest.mark.skip(reason="this test requires a POSIX platform other than MacOS"))
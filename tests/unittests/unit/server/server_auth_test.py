@@ -6,6 +6,7 @@
 
 import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 from xpra.os_util import pollwait, strtobytes, OSX, POSIX
 from xpra.exit_codes import (
@@ -46,6 +47,13 @@ class ServerAuthTest(ServerTestUtil):
         if r!=exit_code:
             raise RuntimeError(f"expected info client to return {estr(exit_code)} but got {estr(r)}")
 
+    def _test_auth_concurrently(self, *cases):
+        #each case starts its own server on a free display,
+        #so they can all run at the same time:
+        with ThreadPoolExecutor(max_workers=len(cases)) as executor:
+            #consuming the results re-raises the first failure:
+            tuple(executor.map(lambda args : self._test_auth(*args), cases))
+
     def test_fail(self):
         self._test_auth("fail", "", EXIT_CONNECTION_FAILED)
 
@@ -64,10 +72,12 @@ class ServerAuthTest(ServerTestUtil):
         from xpra.os_util import get_hex_uuid
         password = get_hex_uuid()
         f = self._temp_file(strtobytes(password))
-        self._test_auth("file", "", EXIT_PASSWORD_REQUIRED)
-        self._test_auth(f"file:filename={f.name}", "", EXIT_PASSWORD_REQUIRED)
-        self._test_auth(f"file:filename={f.name}", "", EXIT_OK, password)
-        self._test_auth(f"file:filename={f.name}", "", EXIT_AUTHENTICATION_FAILED, password+"A")
+        self._test_auth_concurrently(
+            ("file", "", EXIT_PASSWORD_REQUIRED),
+            (f"file:filename={f.name}", "", EXIT_PASSWORD_REQUIRED),
+            (f"file:filename={f.name}", "", EXIT_OK, password),
+            (f"file:filename={f.name}", "", EXIT_AUTHENTICATION_FAILED, password+"A"),
+            )
         f.close()
 
     def test_multifile(self):
@@ -78,10 +88,12 @@ class ServerAuthTest(ServerTestUtil):
         displays = ""
         data = "%s|%s|%i|%i|%s||" % (username, password, os.getuid(), os.getgid(), displays)
         f = self._temp_file(strtobytes(data))
-        self._test_auth("multifile", "", EXIT_PASSWORD_REQUIRED)
-        self._test_auth(f"multifile:filename={f.name}", "", EXIT_PASSWORD_REQUIRED)
-        self._test_auth(f"multifile:filename={f.name}", "", EXIT_OK, password)
-        self._test_auth(f"multifile:filename={f.name}", "", EXIT_AUTHENTICATION_FAILED, password+"A")
+        self._test_auth_concurrently(
+            ("multifile", "", EXIT_PASSWORD_REQUIRED),
+            (f"multifile:filename={f.name}", "", EXIT_PASSWORD_REQUIRED),
+            (f"multifile:filename={f.name}", "", EXIT_OK, password),
+            (f"multifile:filename={f.name}", "", EXIT_AUTHENTICATION_FAILED, password+"A"),
+            )
         f.close()
 
 
@@ -5,16 +5,20 @@
 # later version. See the file COPYING for details.
 
 import os
+import socket
 import shutil
 import unittest
 import tempfile
-from time import monotonic
+from time import monotonic, sleep
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 from xpra.util import repr_ellipsized, envint
 from xpra.os_util import load_binary_file, pollwait, OSX, POSIX
 from xpra.exit_codes import EXIT_OK, EXIT_CONNECTION_FAILED, EXIT_SSL_CERTIFICATE_VERIFY_FAILURE
 from xpra.net.net_util import get_free_tcp_port
-from xpra.platform.dotxpra import DISPLAY_PREFIX
+from xpra.platform.dotxpra import DotXpra, DISPLAY_PREFIX
 from unit.server_test_util import ServerTestUtil, log, estr, log_gap
 
 
@@ -22,8 +26,117 @@ CONNECT_WAIT = envint("XPRA_TEST_CONNECT_WAIT", 20)
 SUBPROCESS_WAIT = envint("XPRA_TEST_SUBPROCESS_WAIT", CONNECT_WAIT*2)
 
 
+def wait_socket_ready(address, deadline):
+    """ probe the tcp socket until it accepts connections or we reach the deadline """
+    while True:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(0.2)
+        try:
+            sock.connect(address)
+            return True
+        except OSError:
+            if monotonic()>=deadline:
+                return False
+            sleep(0.05)
+        finally:
+            sock.close()
+
+
+def generate_cert_data():
+    """
+    generates a self-signed certificate in process,
+    returns the private key followed by the certificate, in PEM format
+    """
+    try:
+        # pylint: disable=import-outside-toplevel
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        log("cannot generate certificates using python-cryptography", exc_info=True)
+        return None
+    backend = default_backend()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=backend)
+    name = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
+        x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "Denial"),
+        x509.NameAttribute(NameOID.LOCALITY_NAME, "Springfield"),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Dis"),
+        x509.NameAttribute(NameOID.COMMON_NAME, "localhost"),
+        ])
+    now = datetime.now(timezone.utc)
+    public_key = key.public_key()
+    #same extensions as 'openssl req -x509':
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        public_key).serial_number(x509.random_serial_number()).not_valid_before(
+        now).not_valid_after(now+timedelta(days=2)).add_extension(
+        x509.BasicConstraints(ca=True, path_length=None), critical=True).add_extension(
+        x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False).add_extension(
+        x509.AuthorityKeyIdentifier.from_issuer_public_key(public_key), critical=False).sign(
+        key, hashes.SHA256(), backend)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+        ) + cert.public_bytes(serialization.Encoding.PEM)
+
+
 class ServerSocketsTest(ServerTestUtil):
 
+    @classmethod
+    def setUpClass(cls):
+        ServerTestUtil.setUpClass()
+        cls.ssl_tmpdir = None
+        cls.ssl_certfile = None
+
+    @classmethod
+    def tearDownClass(cls):
+        ServerTestUtil.tearDownClass()
+        if cls.ssl_tmpdir:
+            shutil.rmtree(cls.ssl_tmpdir)
+            cls.ssl_tmpdir = None
+            cls.ssl_certfile = None
+
+    @classmethod
+    def get_ssl_certfile(cls):
+        """
+        generates a self-signed certificate the first time it is needed,
+        subsequent calls re-use the same file
+        """
+        if cls.ssl_certfile:
+            return cls.ssl_certfile
+        if not cls.ssl_tmpdir:
+            cls.ssl_tmpdir = tempfile.mkdtemp(suffix='ssl-xpra')
+        cert_data = generate_cert_data() or cls.openssl_cert_data()
+        log("generated cert data: %s", repr_ellipsized(cert_data))
+        if not cert_data:
+            return None
+        certfile = os.path.join(cls.ssl_tmpdir, "cert.pem")
+        with open(certfile, 'wb') as f:
+            f.write(cert_data)
+        cls.ssl_certfile = certfile
+        return certfile
+
+    @classmethod
+    def openssl_cert_data(cls):
+        keyfile = os.path.join(cls.ssl_tmpdir, "key.pem")
+        outfile = os.path.join(cls.ssl_tmpdir, "out.pem")
+        #a 2048 bit key is plenty for a localhost test certificate:
+        openssl_command = [
+            "openssl", "req", "-new", "-newkey", "rsa:2048", "-days", "2", "-nodes", "-x509",
+            "-subj", "/C=US/ST=Denial/L=Springfield/O=Dis/CN=localhost",
+            "-keyout", keyfile, "-out", outfile,
+            ]
+        openssl = cls.class_run_command(openssl_command)
+        assert pollwait(openssl, 20)==0, "openssl certificate generation failed"
+        #combine the two files, no need to read the result back:
+        cert_data = b"".join(load_binary_file(fname) or b"" for fname in (keyfile, outfile))
+        if not cert_data:
+            log.warn("Warning: cannot run '%s'", " ".join(openssl_command))
+        return cert_data
+
     def get_run_env(self):
         env = super().get_run_env()
         env["XPRA_CONNECT_TIMEOUT"] = str(CONNECT_WAIT)
@@ -43,16 +156,16 @@ class ServerSocketsTest(ServerTestUtil):
         server = self.start_server(display, f"--auth={auth}", "--printing=no", *server_args)
         #we should always be able to get the version:
         uri = uri_prefix + str(display_no)
-        start = monotonic()
-        while True:
-            client = self.run_xpra(["version", uri] + list(server_args or ()))
-            r = pollwait(client, CONNECT_WAIT)
-            if r==0:
-                break
-            if r is None:
-                client.terminate()
-            if monotonic()-start>SUBPROCESS_WAIT:
-                raise Exception(f"version client failed to connect, returned {estr(r)}")
+        #cheap socket probes until the server is listening,
+        #so that we only need to run one version client:
+        if not self.wait_server_ready(uri, server_args, monotonic()+SUBPROCESS_WAIT):
+            raise Exception(f"server is not listening on {uri}")
+        client = self.run_xpra(["version", uri] + list(server_args or ()))
+        r = pollwait(client, CONNECT_WAIT)
+        if r is None:
+            client.terminate()
+        if r!=0:
+            raise Exception(f"version client failed to connect, returned {estr(r)}")
         #try to connect
         cmd = ["connect-test", uri] + [x.replace("$DISPLAY_NO", str(display_no)) for x in client_args]
         f = None
@@ -78,6 +191,21 @@ class ServerSocketsTest(ServerTestUtil):
             raise Exception("expected info client to return %s but got %s" % (estr(exit_code), estr(r)))
         pollwait(server, 10)
 
+    def wait_server_ready(self, uri, server_args, deadline):
+        if uri.startswith(DISPLAY_PREFIX):
+            #local socket, look for it in the socket directories the server uses:
+            sockdirs = [x.split("=", 1)[1] for x in list(self.default_xpra_args)+list(server_args)
+                        if x.startswith("--socket-dir=") or x.startswith("--socket-dirs=")]
+            dotxpra = DotXpra(None, sockdirs) if sockdirs else self.dotxpra
+            while True:
+                if dotxpra.socket_details(matching_state=DotXpra.LIVE, matching_display=uri):
+                    return True
+                if monotonic()>=deadline:
+                    return False
+                sleep(0.05)
+        url = urlparse(uri)
+        return wait_socket_ready((url.hostname, url.port), deadline)
+
     def test_default_socket(self):
         self._test_connect([], "allow", [], b"hello", DISPLAY_PREFIX, EXIT_OK)
 
@@ -103,29 +231,12 @@ class ServerSocketsTest(ServerTestUtil):
         ws_port = get_free_tcp_port()
         wss_port = get_free_tcp_port()
         ssl_port = get_free_tcp_port()
+        certfile = self.get_ssl_certfile()
+        if not certfile:
+            #cannot run openssl? (happens from rpmbuild)
+            log.warn("SSL test skipped, cannot generate a certificate")
+            return
         try:
-            tmpdir = tempfile.mkdtemp(suffix='ssl-xpra')
-            keyfile = os.path.join(tmpdir, "key.pem")
-            outfile = os.path.join(tmpdir, "out.pem")
-            openssl_command = [
-                "openssl", "req", "-new", "-newkey", "rsa:4096", "-days", "2", "-nodes", "-x509",
-                "-subj", "/C=US/ST=Denial/L=Springfield/O=Dis/CN=localhost",
-                "-keyout", keyfile, "-out", outfile,
-                ]
-            openssl = self.run_command(openssl_command)
-            assert pollwait(openssl, 20)==0, "openssl certificate generation failed"
-            #combine the two files:
-            certfile = os.path.join(tmpdir, "cert.pem")
-            with open(certfile, 'wb') as cert:
-                for fname in (keyfile, outfile):
-                    with open(fname, 'rb') as f:
-                        cert.write(f.read())
-            cert_data = load_binary_file(certfile)
-            log("generated cert data: %s", repr_ellipsized(cert_data))
-            if not cert_data:
-                #cannot run openssl? (happens from rpmbuild)
-                log.warn("SSL test skipped, cannot run '%s'", b" ".join(openssl_command))
-                return
             server_args = [
                 f"--bind-tcp=0.0.0.0:{tcp_port}",
                 f"--bind-ws=0.0.0.0:{ws_port}",
@@ -139,16 +250,26 @@ class ServerSocketsTest(ServerTestUtil):
             log("starting test ssl server on %s", display)
             server = self.start_server(display, *server_args)
 
-            #test it with openssl client:
-            for port in (tcp_port, ssl_port, ws_port, wss_port):
+            #test it with openssl client,
+            #the ports are independent so we can probe them all at once:
+            def openssl_verify(port):
+                #fail if the certificate does not verify:
                 openssl_verify_command = (
 					"openssl", "s_client", "-connect",
 					"127.0.0.1:%i" % port, "-CAfile", certfile,
+					"-verify_return_error",
 					)
-                devnull = os.open(os.devnull, os.O_WRONLY)
-                openssl = self.run_command(openssl_verify_command, stdin=devnull, shell=True)
-                r = pollwait(openssl, 10)
-                assert r==0, "openssl certificate verification failed, returned %s" % r
+                devnull = os.open(os.devnull, os.O_RDONLY)
+                try:
+                    openssl = self.run_command(openssl_verify_command, stdin=devnull)
+                finally:
+                    os.close(devnull)
+                return pollwait(openssl, 10)
+            ports = (tcp_port, ssl_port, ws_port, wss_port)
+            with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+                results = tuple(executor.map(openssl_verify, ports))
+            for port, r in zip(ports, results):
+                assert r==0, "openssl certificate verification failed on port %i, returned %s" % (port, r)
 
             def test_connect(uri, exit_code, *client_args):
                 cmd = ["info", uri] + list(client_args)
@@ -174,7 +295,6 @@ class ServerSocketsTest(ServerTestUtil):
             test_connect(f"wss://127.0.0.1:{wss_port}/", EXIT_SSL_CERTIFICATE_VERIFY_FAILURE)
 
         finally:
-            shutil.rmtree(tmpdir)
             if server:
                 server.terminate()
 
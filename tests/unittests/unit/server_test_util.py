@@ -61,7 +61,9 @@ class ServerTestUtil(ProcessTestUtil):
     def tearDownClass(cls):
         ProcessTestUtil.tearDownClass()
         displays = set(cls.displays())
-        new_displays = displays - set(cls.existing_displays)
+        #only stop the displays we have allocated,
+        #others may belong to tests running in parallel:
+        new_displays = (displays - set(cls.existing_displays)) & cls.allocated_displays
         if new_displays:
             for x in list(new_displays):
                 log("stopping display %s" % x)
@@ -5,8 +5,6 @@
 
 import time
 import asyncio
-from queue import Queue
-from collections import namedtuple
 
 from time import monotonic
 from xpra.make_thread import start_thread
@@ -27,9 +25,6 @@ def get_threaded_loop():
     return singleton
 
 
-ExceptionWrapper = namedtuple("ExceptionWrapper", "exception")
-
-
 class threaded_asyncio_loop:
     """
     shim for quic asyncio sockets,
@@ -78,25 +73,14 @@ class threaded_asyncio_loop:
 
 
     def sync(self, async_fn, *args):
-        response = Queue()
-        async def awaitable():
-            log("awaitable()")
-            try:
-                r = await async_fn(*args)
-                response.put(r)
-            except Exception as e:
-                log(f"error calling async function {async_fn} with {args}", exc_info=True)
-                response.put(ExceptionWrapper(e))
-        def tsafe():
-            r = awaitable()
-            log(f"awaitable={r}")
-            f = asyncio.run_coroutine_threadsafe(r, self.loop)
-            log(f"run_coroutine_threadsafe({r}, {self.loop})={f}")
-        self.loop.call_soon_threadsafe(tsafe)
-        log("sync: waiting for response")
-        r = response.get()
-        if isinstance(r, ExceptionWrapper):
-            e = r.exception
-            raise Exception(str(e) or type(e))
+        #run_coroutine_threadsafe schedules the coroutine on our loop directly,
+        #and the concurrent future it returns wakes us up as soon as it completes:
+        f = asyncio.run_coroutine_threadsafe(async_fn(*args), self.loop)
+        log(f"sync: waiting for response from {f}")
+        try:
+            r = f.result()
+        except Exception as e:
+            log(f"error calling async function {async_fn} with {args}", exc_info=True)
+            raise Exception(str(e) or type(e)) from None
         log(f"sync: response={r}")
         return r
@@ -5,7 +5,8 @@
 
 import socket
 import ipaddress
-from queue import Queue
+from collections import deque
+from threading import Lock
 from typing import Dict, Callable, Optional, Union, cast
 
 from aioquic.quic.configuration import QuicConfiguration
@@ -28,7 +29,6 @@ from xpra.net.quic.connection import XpraQuicConnection
 from xpra.net.quic.asyncio_thread import get_threaded_loop
 from xpra.net.quic.common import USER_AGENT, binary_headers
 from xpra.util import ellipsizer, envbool
-from xpra.os_util import memoryview_to_bytes
 from xpra.log import Logger
 log = Logger("quic")
 
@@ -49,6 +49,8 @@ WS_HEADERS = {
         "sec-websocket-protocol" : "xpra",
         "user-agent" : USER_AGENT,
         }
+#these never change, so only encode them once:
+WS_HEADERS_BIN = binary_headers(WS_HEADERS)
 
 
 class ClientWebSocketConnection(XpraQuicConnection):
@@ -56,22 +58,29 @@ class ClientWebSocketConnection(XpraQuicConnection):
     def __init__(self, connection : HttpConnection, stream_id: int, transmit: Callable[[], None],
                  host : str, port : int, info=None, options=None) -> None:
         super().__init__(connection, stream_id, transmit, host, port, info, options)
-        self.write_buffer = Queue()
+        self.write_buffer = deque()
+        #writes come from the network write thread, flush_writes() from the asyncio thread:
+        self.write_buffer_lock = Lock()
 
     def flush_writes(self):
-        #flush the buffered writes:
-        while self.write_buffer.qsize()>0:
-            buf = self.write_buffer.get()
-            self.connection.send_data(self.stream_id, memoryview_to_bytes(buf), end_stream=False)
-        self.transmit()
-        self.write_buffer = None
+        #flush the buffered writes as a single stream frame,
+        #holding the lock until the data is sent so that new writes cannot overtake it:
+        with self.write_buffer_lock:
+            bufs = []
+            while self.write_buffer:
+                bufs.append(self.write_buffer.popleft())
+            if bufs:
+                self.connection.send_data(self.stream_id, b"".join(bufs), end_stream=False)
+            self.transmit()
+            self.write_buffer = None
 
     def write(self, buf):
         log(f"write(%s) {len(buf)} bytes", ellipsizer(buf))
-        if self.write_buffer is not None:
-            #buffer it until we are connected and call flush_writes()
-            self.write_buffer.put(buf)
-            return len(buf)
+        with self.write_buffer_lock:
+            if self.write_buffer is not None:
+                #buffer it until we are connected and call flush_writes()
+                self.write_buffer.append(buf)
+                return len(buf)
         return super().write(buf)
 
     def http_event_received(self, event: H3Event) -> None:
@@ -79,13 +88,15 @@ class ClientWebSocketConnection(XpraQuicConnection):
         if isinstance(event, HeadersReceived):
             for header, value in event.headers:
                 if header == b"sec-websocket-protocol":
-                    subprotocols = value.decode().split(",")
-                    if "xpra" not in subprotocols:
+                    #compare the raw values, no need to decode them:
+                    subprotocols = [v.strip() for v in value.split(b",")]
+                    if b"xpra" not in subprotocols:
                         log.warn(f"Warning: unsupported websocket subprotocols {subprotocols}")
                         self.close()
                         return
                     self.accepted = True
                     self.flush_writes()
+                    break
             return
         super().http_event_received(event)
 
@@ -106,13 +117,13 @@ class WebSocketClient(QuicConnectionProtocol):
         websocket = ClientWebSocketConnection(self._http, stream_id, self.transmit,
                                               host, port)
         self._websockets[stream_id] = websocket
-        headers = {
+        #pseudo-headers must come first:
+        headers = binary_headers({
             ":authority" : host,
             ":path" : path,
-            }
-        headers.update(WS_HEADERS)
+            }) + WS_HEADERS_BIN
         log("open: sending http headers for websocket upgrade")
-        self._http.send_headers(stream_id=stream_id, headers=binary_headers(headers))
+        self._http.send_headers(stream_id=stream_id, headers=headers)
         self.transmit()
         return websocket
 
@@ -121,14 +132,13 @@ class WebSocketClient(QuicConnectionProtocol):
             self.http_event_received(http_event)
 
     def http_event_received(self, event: H3Event) -> None:
-        if isinstance(event, (HeadersReceived, DataReceived)):
-            stream_id = event.stream_id
-            if stream_id in self._websockets:
-                # websocket
-                websocket : ClientWebSocketConnection = self._websockets[stream_id]
+        #DataReceived is listed first since it is by far the most common event:
+        if isinstance(event, (DataReceived, HeadersReceived)):
+            websocket = self._websockets.get(event.stream_id)
+            if websocket is not None:
                 websocket.http_event_received(event)
             else:
-                log.warn(f"Warning: unexpected websocket stream id: {stream_id}")
+                log.warn(f"Warning: unexpected websocket stream id: {event.stream_id}")
         else:
             log.warn(f"Warning: unexpected http event type: {event}")
 
@@ -173,12 +183,11 @@ def quic_connect(host : str, port : int, path : str,
         # lookup remote address
         infos = await tl.loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
         log(f"getaddrinfo({host}, {port}, SOCK_DGRAM)={infos}")
-        addr = infos[0][4]
-        if len(addr) == 2:
-            if IPV6:
-                addr = ("::ffff:" + addr[0], addr[1], 0, 0)
-            else:
-                addr = (addr[0], addr[1])
+        family, _, _, _, addr = infos[0]
+        if IPV6 and family==socket.AF_INET:
+            #our socket is bound to '::', so use the IPv4-mapped form,
+            #IPv6 results are used as returned:
+            addr = (f"::ffff:{addr[0]}", addr[1], 0, 0)
         transport, protocol = await tl.loop.create_datagram_endpoint(create_protocol, sock=sock)
         log(f"transport={transport}, protocol={protocol}")
         protocol = cast(QuicConnectionProtocol, protocol)
@@ -3,7 +3,7 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
-from queue import Queue
+from queue import SimpleQueue, Empty
 from typing import Callable, Union
 
 from aioquic.h0.connection import H0Connection
@@ -11,27 +11,38 @@ from aioquic.h3.connection import H3Connection
 from aioquic.h3.events import DataReceived, H3Event
 
 from xpra.net.bytestreams import Connection
+from xpra.net.common import ConnectionClosedException
 from xpra.net.websockets.header import close_packet
 from xpra.net.quic.common import binary_headers
 from xpra.util import ellipsizer
-from xpra.os_util import memoryview_to_bytes
 from xpra.log import Logger
 log = Logger("quic")
 
 HttpConnection = Union[H0Connection, H3Connection]
 
 
+def _to_bytes(buf) -> bytes:
+    #aioquic's frame encoder needs an immutable buffer,
+    #so make exactly one copy unless we already have bytes:
+    if isinstance(buf, bytes):
+        return buf
+    return memoryview(buf).tobytes()
+
+
 class XpraQuicConnection(Connection):
     def __init__(self, connection: HttpConnection, stream_id: int, transmit: Callable[[], None],
                  host : str, port : int, info=None, options=None) -> None:
         Connection.__init__(self, (host, port), "wss", info=info, options=options)
         self.socktype_wrapped = "quic"
         self.connection: HttpConnection = connection
-        self.read_queue: Queue[bytes] = Queue()
+        self.read_queue: SimpleQueue[bytes] = SimpleQueue()
         self.stream_id: int = stream_id
         self.transmit: Callable[[], None] = transmit
         self.accepted : bool = False
         self.closed : bool = False
+        self.corked : bool = False
+        self._config_info : dict = {}
+        self._eof : bool = False
 
     def __repr__(self):
         return f"XpraQuicConnection<{self.stream_id}>"
@@ -39,17 +50,7 @@ class XpraQuicConnection(Connection):
     def get_info(self) -> dict:
         info = super().get_info()
         qinfo = info.setdefault("quic", {})
-        quic = getattr(self.connection, "_quic", None)
-        if quic:
-            config = quic.configuration
-            qinfo.update({
-                "alpn-protocols" : config.alpn_protocols,
-                "idle-timeout"  : config.idle_timeout,
-                "client"        : config.is_client,
-                "max-data"      : config.max_data,
-                "max-stream-data" : config.max_stream_data,
-                "server-name"   : config.server_name or "",
-                })
+        qinfo.update(self.get_config_info())
         qinfo.update({
             "read-queue"    : self.read_queue.qsize(),
             "stream-id"     : self.stream_id,
@@ -58,6 +59,23 @@ class XpraQuicConnection(Connection):
             })
         return info
 
+    def get_config_info(self) -> dict:
+        #the configuration does not change once the connection exists,
+        #so we only need to query it once:
+        if not self._config_info:
+            quic = getattr(self.connection, "_quic", None)
+            if quic:
+                config = quic.configuration
+                self._config_info = {
+                    "alpn-protocols" : config.alpn_protocols,
+                    "idle-timeout"  : config.idle_timeout,
+                    "client"        : config.is_client,
+                    "max-data"      : config.max_data,
+                    "max-stream-data" : config.max_stream_data,
+                    "server-name"   : config.server_name or "",
+                    }
+        return self._config_info
+
     def http_event_received(self, event: H3Event) -> None:
         log("ws:http_event_received(%s)", ellipsizer(event))
         if self.closed:
@@ -77,7 +95,8 @@ class XpraQuicConnection(Connection):
         self.closed = True
         if self.accepted:
             data = close_packet(code, reason)
-            self.write(data)
+            self.connection.send_data(stream_id=self.stream_id, data=data, end_stream=True)
+            self.transmit()
         else:
             self.send_headers({":status" : code})
             self.transmit()
@@ -86,13 +105,47 @@ class XpraQuicConnection(Connection):
         #HttpConnection takes a pair of byte strings:
         self.connection.send_headers(stream_id=self.stream_id, headers=binary_headers(headers), end_stream=self.closed)
 
+    def set_cork(self, cork : bool):
+        #the protocol layer corks the connection while writing multiple buffers
+        #(ie: packet header and payload), so we only need to transmit once at the end:
+        self.corked = cork
+        if not cork:
+            self.transmit()
+
     def write(self, buf):
         log("XpraQuicConnection.write(%s)", ellipsizer(buf))
-        data = memoryview_to_bytes(buf)
-        self.connection.send_data(stream_id=self.stream_id, data=data, end_stream=self.closed)
-        self.transmit()
+        if self.closed:
+            #don't bother copying the buffer:
+            raise ConnectionClosedException(f"{self} is closed")
+        self.connection.send_data(stream_id=self.stream_id, data=_to_bytes(buf), end_stream=False)
+        if not self.corked:
+            self.transmit()
         return len(buf)
 
     def read(self, n):
         log("XpraQuicConnection.read(%s)", n)
-        return self.read_queue.get()
+        return self.read_available()
+
+    def read_available(self) -> bytes:
+        #wait for some data, then also consume all the other chunks already queued
+        #so the protocol layer can parse them in one go:
+        if self._eof:
+            return b""
+        chunk = self.read_queue.get()
+        if not chunk:
+            return chunk
+        chunks = [chunk]
+        try:
+            while True:
+                chunk = self.read_queue.get_nowait()
+                if not chunk:
+                    #an empty chunk marks the end of the stream,
+                    #return what we have and report EOF on the next call:
+                    self._eof = True
+                    break
+                chunks.append(chunk)
+        except Empty:
+            pass
+        if len(chunks)==1:
+            return chunks[0]
+        return b"".join(chunks)